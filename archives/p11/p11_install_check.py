@@ -16,17 +16,17 @@ def mock_llm(state: MessagesState):
     """モックLLM関数 - 簡単な応答を返す"""
     return {"messages": [{"role": "ai", "content": "hello world"}]}
 
+# グラフの構築（モジュール読み込み時に1回だけコンパイルし、実行ごとに再利用する）
+graph = StateGraph(MessagesState)
+graph.add_node(mock_llm)
+graph.add_edge(START, "mock_llm")
+graph.add_edge("mock_llm", END)
+graph = graph.compile()
+
 def main():
     """メイン関数 - LangGraphの動作確認"""
     print("LangGraph インストール確認を開始します...")
     
-    # グラフの構築
-    graph = StateGraph(MessagesState)
-    graph.add_node(mock_llm)
-    graph.add_edge(START, "mock_llm")
-    graph.add_edge("mock_llm", END)
-    graph = graph.compile()
-    
     # グラフの実行
     result = graph.invoke({"messages": [{"role": "user", "content": "hi!"}]})
     
@@ -8,12 +8,16 @@ OpenAI API（gpt-4o-mini）を使用します。
 
 from langchain.tools import tool
 from langchain.chat_models import init_chat_model
-from langchain.messages import AnyMessage, SystemMessage, ToolMessage, HumanMessage
+from langchain.messages import AnyMessage, SystemMessage, ToolMessage, HumanMessage, AIMessageChunk
 from typing_extensions import TypedDict, Annotated
 from typing import Literal
 from langgraph.graph import StateGraph, START, END
 import operator
+from types import MappingProxyType
+import asyncio
 import os
+import httpx
+import sys
 from dotenv import load_dotenv
 
 # ============================================
@@ -22,6 +26,12 @@ from dotenv import load_dotenv
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
+# DEMO_TRACE=1 のときだけLangSmithのトレースを有効にする
+# （.envでトレースが有効になっていても、ノードのイベントごとのトレース送信を行わない）
+if os.getenv("DEMO_TRACE") != "1":
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
 # ============================================
 # OpenAI設定
 # ============================================
@@ -48,10 +58,17 @@ if not os.getenv("OPENAI_API_KEY"):
 # ============================================
 print("\n1. ツールとモデルの定義中...")
 
+# 接続プール（全テストケースでTCP/TLS接続を使い回し、ハンドシェイクを繰り返さない）
+# モデルノードは非同期（ainvoke）で呼ぶので、非同期クライアントだけを渡す
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+HTTP_TIMEOUT = 60
+http_async_client = httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
 # OpenAI APIを使用
 model = init_chat_model(
     MODEL_NAME,
-    temperature=0
+    temperature=0,
+    http_async_client=http_async_client,
 )
 
 # ツールの定義
@@ -87,7 +104,9 @@ def divide(a: int, b: int) -> float:
 
 # LLMにツールをバインド
 tools = [add, multiply, divide]
-tools_by_name = {tool.name: tool for tool in tools}
+# ツール実行時はRunnable/引数検証を通さず、元のPython関数を直接呼び出す
+# （@toolで包んだものはbind_toolsのスキーマ生成にだけ使う）
+raw_tools_by_name = MappingProxyType({tool.name: tool.func for tool in tools})
 model_with_tools = model.bind_tools(tools)
 
 print("✓ ツールとモデルの定義が完了しました")
@@ -108,11 +127,11 @@ print("✓ 状態の定義が完了しました")
 # ============================================
 print("\n3. モデルノードの定義中...")
 
-def llm_call(state: dict):
+async def llm_call(state: dict):
     """LLMがツールを呼び出すかどうかを決定します。"""
     return {
         "messages": [
-            model_with_tools.invoke(
+            await model_with_tools.ainvoke(
                 [
                     SystemMessage(
                         content="You are a helpful assistant tasked with performing arithmetic on a set of inputs."
@@ -135,8 +154,8 @@ def tool_node(state: dict):
     """ツール呼び出しを実行します。"""
     result = []
     for tool_call in state["messages"][-1].tool_calls:
-        tool = tools_by_name[tool_call["name"]]
-        observation = tool.invoke(tool_call["args"])
+        func = raw_tools_by_name[tool_call["name"]]
+        observation = func(**tool_call["args"])
         result.append(ToolMessage(content=observation, tool_call_id=tool_call["id"]))
     return {"messages": result}
 
@@ -193,51 +212,93 @@ print("\n" + "="*50)
 print("エージェントの実行")
 print("="*50)
 
-# テストケース0: 挨拶
-print("\n【テストケース0】こんにちは")
-messages = [HumanMessage(content="こんにちは")]
-result = agent.invoke({"messages": messages, "llm_calls": 0})
-
-print("\n結果:")
-for m in result["messages"]:
-    m.pretty_print()
-
-print(f"\nLLM呼び出し回数: {result['llm_calls']}")
-
-# テストケース1: 加算
-print("\n【テストケース1】3 + 4 を計算")
-messages = [HumanMessage(content="Add 3 and 4.")]
-result = agent.invoke({"messages": messages, "llm_calls": 0})
-
-print("\n結果:")
-for m in result["messages"]:
-    m.pretty_print()
-
-print(f"\nLLM呼び出し回数: {result['llm_calls']}")
-
-# テストケース2: 乗算
-print("\n" + "-"*50)
-print("\n【テストケース2】5 × 6 を計算")
-messages = [HumanMessage(content="Multiply 5 and 6.")]
-result = agent.invoke({"messages": messages, "llm_calls": 0})
-
-print("\n結果:")
-for m in result["messages"]:
-    m.pretty_print()
-
-print(f"\nLLM呼び出し回数: {result['llm_calls']}")
-
-# テストケース3: 除算
-print("\n" + "-"*50)
-print("\n【テストケース3】10 ÷ 2 を計算")
-messages = [HumanMessage(content="Divide 10 by 2.")]
-result = agent.invoke({"messages": messages, "llm_calls": 0})
-
-print("\n結果:")
-for m in result["messages"]:
-    m.pretty_print()
-
-print(f"\nLLM呼び出し回数: {result['llm_calls']}")
+# テストケース（タイトル, 質問）
+TEST_CASES = [
+    # テストケース0: 挨拶
+    ("こんにちは", "こんにちは"),
+    # テストケース1: 加算
+    ("3 + 4 を計算", "Add 3 and 4."),
+    # テストケース2: 乗算
+    ("5 × 6 を計算", "Multiply 5 and 6."),
+    # テストケース3: 除算
+    ("10 ÷ 2 を計算", "Divide 10 by 2."),
+]
+
+
+# 実行時の初期状態のひな形（messagesだけを質問ごとに差し替える）
+INPUT_TEMPLATE = MappingProxyType({"messages": [], "llm_calls": 0})
+
+
+def build_input(question: str) -> dict:
+    """質問から初期状態を作成"""
+    return {**INPUT_TEMPLATE, "messages": [HumanMessage(content=question)]}
+
+
+async def stream_test_case(question: str, queue: asyncio.Queue) -> None:
+    """1件のテストケースをストリーミング実行し、トークンと最終状態をキューに送る"""
+    inputs = build_input(question)
+    final_state = None
+    try:
+        # messagesでトークンを、valuesで最終状態（llm_calls）を1回の実行で受け取る
+        async for mode, chunk in agent.astream(inputs, stream_mode=["messages", "values"]):
+            if mode == "messages":
+                message_chunk, _ = chunk
+                # LLMが生成したトークンだけを表示する（入力のHumanMessageやToolMessageは除く）
+                if isinstance(message_chunk, AIMessageChunk) and message_chunk.content:
+                    queue.put_nowait(("token", message_chunk.content))
+            elif mode == "values":
+                final_state = chunk
+    except Exception as e:
+        # 表示側が待ち続けないように、例外もキュー経由で渡す
+        queue.put_nowait(("error", e))
+        return
+    queue.put_nowait(("done", final_state))
+
+
+async def run_test_cases(cases: list[tuple[str, str]]) -> None:
+    """各テストケースを並列に実行し、ケースの順番どおりにトークンを表示"""
+    # ケース同士は互いに独立しているので同時に実行し、
+    # 表示中でないケースのトークンは各自のキューに溜めておく
+    queues = [asyncio.Queue() for _ in cases]
+    tasks = [
+        asyncio.create_task(stream_test_case(question, queue))
+        for (_, question), queue in zip(cases, queues)
+    ]
+    try:
+        for i, ((title, _), queue) in enumerate(zip(cases, queues)):
+            if i > 0:
+                print("\n" + "-"*50)
+            print(f"\n【テストケース{i}】{title}")
+
+            print("\n結果:")
+            while True:
+                kind, value = await queue.get()
+                if kind == "error":
+                    print()
+                    raise value
+                if kind == "done":
+                    break
+                sys.stdout.write(value)
+                sys.stdout.flush()
+            print()
+
+            print(f"\nLLM呼び出し回数: {value['llm_calls']}")
+    finally:
+        # エラーで中断した場合は、残りのケースの実行を止める
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def main():
+    """テストケースを実行し、終了時に共有HTTPクライアントを閉じる"""
+    try:
+        await run_test_cases(TEST_CASES)
+    finally:
+        await http_async_client.aclose()
+
+
+asyncio.run(main())
 
 print("\n" + "="*50)
 print("クイックスタートが完了しました！")
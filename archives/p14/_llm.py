@@ -0,0 +1,39 @@
+"""
+p14 のワークフロー例で使うチャットモデルの生成
+
+.env の読み込みと HTTP 接続プールをここにまとめ、各スクリプトは get_llm() で
+同じ設定のモデルを受け取ります。
+"""
+
+import os
+from functools import lru_cache
+import httpx
+from dotenv import load_dotenv
+from langchain.chat_models import init_chat_model
+
+load_dotenv()
+MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# 接続プール（TCP/TLS接続を使い回し、HTTP/2で1本の接続に複数リクエストを多重化する）
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+HTTP_TIMEOUT = 60
+http_client = httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+http_async_client = httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
+
+@lru_cache(maxsize=None)
+def get_llm(model_name: str = MODEL_NAME):
+    """共有の接続プールを使うチャットモデルを初回使用時に作成（モデル名ごとに1つ）"""
+    return init_chat_model(
+        model_name,
+        temperature=0,
+        stream_usage=True,  # ストリーミング時も最後のチャンクでトークン使用量を受け取る
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+
+
+async def aclose_clients():
+    """共有のHTTPクライアントを閉じる"""
+    await http_async_client.aclose()
+    http_client.close()
\ No newline at end of file
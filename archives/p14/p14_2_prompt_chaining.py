@@ -1,16 +1,10 @@
 from typing_extensions import TypedDict, Literal
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
-import os
-from dotenv import load_dotenv
+from langgraph.config import get_stream_writer
+import asyncio
+from _llm import get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+llm = get_llm()
 
 # グラフの状態
 class State(TypedDict):
@@ -19,37 +13,47 @@ class State(TypedDict):
     improved_joke: str
     final_joke: str
 
+async def stream_llm(prompt: str) -> str:
+    """LLMの出力をトークン単位でカスタムストリームに流しながら、全文を返す"""
+    writer = get_stream_writer()
+    writer("="*50 + "\n" + prompt + "\n")
+    parts = []
+    async for chunk in llm.astream(prompt):
+        writer(chunk.content)
+        parts.append(chunk.content)
+    writer("\n")
+    return "".join(parts)
+
 # ノード
-def generate_joke(state: State):
+async def generate_joke(state: State):
     """最初のLLM呼び出しで初期ジョークを生成"""
-    print("="*50)
-    print(f"generate_joke: {state['topic']}について短いジョークを書いてください")
-    msg = llm.invoke(f"{state['topic']}について短いジョークを書いてください")
-    print(msg.content)
-    return {"joke": msg.content}
+    joke = await stream_llm(f"{state['topic']}について短いジョークを書いてください")
+    return {"joke": joke}
 
-def check_punchline(state: State):
-    """ジョークにオチがあるかチェックするゲート関数"""
-    # シンプルなチェック - ジョークに「?」や「!」が含まれているか
-    if "?" in state["joke"] or "!" in state["joke"]:
+def has_punchline(text: str) -> str:
+    """テキストにオチがあるかチェック"""
+    # シンプルなチェック - テキストに「?」や「!」が含まれているか
+    if "?" in text or "!" in text:
         return "Pass"
     return "Fail"
 
-def improve_joke(state: State):
+def check_punchline(state: State):
+    """ジョークにオチがあるかチェックするゲート関数"""
+    return has_punchline(state["joke"])
+
+def check_punchline_2(state: State):
+    """改善後のジョークにオチがあるかチェックするゲート関数（あれば仕上げを省略）"""
+    return has_punchline(state["improved_joke"])
+
+async def improve_joke(state: State):
     """2回目のLLM呼び出しでジョークを改善"""
-    print("="*50)
-    print(f"このジョークをより面白くするために言葉遊びを追加してください: {state['joke']}")
-    msg = llm.invoke(f"このジョークをより面白くするために言葉遊びを追加してください: {state['joke']}")
-    print(msg.content)
-    return {"improved_joke": msg.content}
+    improved_joke = await stream_llm(f"このジョークをより面白くするために言葉遊びを追加してください: {state['joke']}")
+    return {"improved_joke": improved_joke}
 
-def polish_joke(state: State):
+async def polish_joke(state: State):
     """3回目のLLM呼び出しで最終的な仕上げ"""
-    print("="*50)
-    print(f"このジョークに驚きの展開を追加してください: {state['improved_joke']}")
-    msg = llm.invoke(f"このジョークに驚きの展開を追加してください: {state['improved_joke']}")
-    print(msg.content)
-    return {"final_joke": msg.content}
+    final_joke = await stream_llm(f"このジョークに驚きの展開を追加してください: {state['improved_joke']}")
+    return {"final_joke": final_joke}
 
 # ワークフローの構築
 workflow = StateGraph(State)
@@ -64,12 +68,33 @@ workflow.add_conditional_edges(
     check_punchline, 
     {"Fail": "improve_joke", "Pass": END}
 )
-workflow.add_edge("improve_joke", "polish_joke")
+workflow.add_conditional_edges(
+    "improve_joke",
+    check_punchline_2,
+    {"Fail": "polish_joke", "Pass": END}
+)
 workflow.add_edge("polish_joke", END)
 
 # コンパイル
 chain = workflow.compile()
 
-state = chain.invoke({"topic": "飴ちゃん"})
+async def main():
+    """トークンをリアルタイムに表示しながらチェーンを実行"""
+    state = {}
+    async for mode, chunk in chain.astream(
+        {"topic": "飴ちゃん"},
+        stream_mode=["updates", "custom"],
+    ):
+        if mode == "custom":
+            # ノード内で生成されたトークンを逐次表示
+            print(chunk, end="", flush=True)
+        else:
+            # 各ノードの更新内容を最終状態にまとめる
+            for update in chunk.values():
+                state.update(update)
+    return state
+
+state = asyncio.run(main())
 print("="*50)
-print(state["final_joke"])
\ No newline at end of file
+# 途中のゲートで終了した場合は、その時点のジョークを表示
+print(state.get("final_joke") or state.get("improved_joke") or state["joke"])
\ No newline at end of file
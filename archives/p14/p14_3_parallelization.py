@@ -1,17 +1,13 @@
 from typing_extensions import TypedDict, Literal
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
-import os
-from dotenv import load_dotenv
+from langgraph.config import get_stream_writer
+import asyncio
+import io
+from _llm import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：",MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+llm = get_llm()
 
 # グラフの状態
 class State(TypedDict):
@@ -22,47 +18,61 @@ class State(TypedDict):
     combined_output: str
 
 # ノード
-def call_llm_1(state: State):
-    """最初のLLM呼び出しでジョークを生成"""
-    msg = llm.invoke(f"{state['topic']}についてジョークを書いてください")
-    return {"joke": msg.content}
-
-def call_llm_2(state: State):
-    """2回目のLLM呼び出しでストーリーを生成"""
-    msg = llm.invoke(f"{state['topic']}についてストーリーを書いてください")
-    return {"story": msg.content}
-
-def call_llm_3(state: State):
-    """3回目のLLM呼び出しで詩を生成"""
-    msg = llm.invoke(f"{state['topic']}について詩を書いてください")
-    return {"poem": msg.content}
+async def call_llm(state: State):
+    """1回のバッチ呼び出しでジョーク、ストーリー、詩を生成（完成したものから順に通知）"""
+    writer = get_stream_writer()
+    keys = ["joke", "story", "poem"]
+    prompts = [
+        f"{state['topic']}についてジョークを書いてください",
+        f"{state['topic']}についてストーリーを書いてください",
+        f"{state['topic']}について詩を書いてください",
+    ]
+    results = {}
+    async for i, msg in llm.abatch_as_completed(prompts):
+        results[keys[i]] = msg.content
+        writer({"key": keys[i], "content": msg.content})
+    return results
 
 def aggregator(state: State):
     """ジョークとストーリーを1つの出力に結合"""
-    combined = f"{state['topic']}についてのストーリー、ジョーク、詩です！\n\n"
-    combined += f"ストーリー:\n{state['story']}\n\n"
-    combined += f"ジョーク:\n{state['joke']}\n\n"
-    combined += f"詩:\n{state['poem']}"
-    return {"combined_output": combined}
+    # 文字列を += で繋ぎ直さず、バッファに順に書き込んで最後に1回だけ取り出す
+    buf = io.StringIO()
+    buf.writelines([
+        f"{state['topic']}についてのストーリー、ジョーク、詩です！\n\n",
+        f"ストーリー:\n{state['story']}\n\n",
+        f"ジョーク:\n{state['joke']}\n\n",
+        f"詩:\n{state['poem']}",
+    ])
+    return {"combined_output": buf.getvalue()}
 
 # ワークフローの構築
 parallel_builder = StateGraph(State)
-parallel_builder.add_node("call_llm_1", call_llm_1)
-parallel_builder.add_node("call_llm_2", call_llm_2)
-parallel_builder.add_node("call_llm_3", call_llm_3)
+parallel_builder.add_node("call_llm", call_llm)
 parallel_builder.add_node("aggregator", aggregator)
 
-# ノードを接続するエッジを追加（並列実行）
-parallel_builder.add_edge(START, "call_llm_1")
-parallel_builder.add_edge(START, "call_llm_2")
-parallel_builder.add_edge(START, "call_llm_3")
-parallel_builder.add_edge("call_llm_1", "aggregator")
-parallel_builder.add_edge("call_llm_2", "aggregator")
-parallel_builder.add_edge("call_llm_3", "aggregator")
+# ノードを接続するエッジを追加（3つのプロンプトはcall_llm内でバッチ実行）
+parallel_builder.add_edge(START, "call_llm")
+parallel_builder.add_edge("call_llm", "aggregator")
 parallel_builder.add_edge("aggregator", END)
 
 parallel_workflow = parallel_builder.compile()
 
-state = parallel_workflow.invoke({"topic": "飴ちゃん"})
+async def main():
+    """完成した出力から順に表示し、最後に結合結果を返す"""
+    combined_output = ""
+    async for mode, chunk in parallel_workflow.astream(
+        {"topic": "飴ちゃん"},
+        stream_mode=["custom", "updates"],
+    ):
+        if mode == "custom":
+            # 3つの出力を待たずに、完成したものからすぐに表示
+            preview = chunk["content"][:50] + "..." if len(chunk["content"]) > 50 else chunk["content"]
+            print(f"[完成] {chunk['key']}: {preview}")
+        elif "aggregator" in chunk:
+            # 最終状態全体ではなく、結合結果だけを受け取る
+            combined_output = chunk["aggregator"]["combined_output"]
+    return combined_output
+
+combined_output = asyncio.run(main())
 print("="*50)
-print(state["combined_output"])
\ No newline at end of file
+print(combined_output)
\ No newline at end of file
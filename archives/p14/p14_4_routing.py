@@ -2,18 +2,14 @@ from typing_extensions import TypedDict, Literal
 from langgraph.graph import StateGraph, START, END
 from langchain.messages import HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
-from langchain.chat_models import init_chat_model
+from functools import lru_cache
 import os
-from dotenv import load_dotenv
+from _llm import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：",MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+llm = get_llm()
+
 # ルーティングロジックとして使用する構造化出力のスキーマ
 class Route(BaseModel):
     step: Literal["poem", "story", "joke"] = Field(
@@ -21,7 +17,10 @@ class Route(BaseModel):
     )
 
 # 構造化出力スキーマでLLMを拡張
-router = llm.with_structured_output(Route)
+# ルーティング判定は3択の分類だけなので、小型で高速なモデルを使う（生成は llm のまま）
+ROUTER_MODEL = os.getenv("ROUTER_MODEL", "gpt-4.1-nano")
+router_llm = get_llm(ROUTER_MODEL)
+router = router_llm.with_structured_output(Route)
 
 # 状態
 class State(TypedDict):
@@ -45,14 +44,39 @@ def llm_call_3(state: State):
     result = llm.invoke(state["input"])
     return {"output": result.content}
 
-def llm_call_router(state: State):
-    """入力を適切なノードにルーティング"""
+ROUTER_PROMPT = "ユーザーのリクエストに基づいて、ストーリー、ジョーク、または詩にルーティングしてください。"
+
+@lru_cache(maxsize=1024)
+def route_input(text: str) -> str:
+    """入力文字列からルーティング先を判定（同じ入力の判定結果はキャッシュして再利用）"""
     # ルーティングロジックとして機能する構造化出力で拡張LLMを実行
     decision = router.invoke([
-        SystemMessage(content="ユーザーのリクエストに基づいて、ストーリー、ジョーク、または詩にルーティングしてください。"),
-        HumanMessage(content=state["input"]),
+        SystemMessage(content=ROUTER_PROMPT),
+        HumanMessage(content=text),
     ])
-    return {"decision": decision.step}
+    return decision.step
+
+# キーワードによるローカルなルーティング判定（LLMを呼び出さずに済む）
+ROUTE_KEYWORDS = {
+    "story": ("ストーリー", "物語", "小説", "story"),
+    "joke": ("ジョーク", "冗談", "ギャグ", "ダジャレ", "joke"),
+    "poem": ("詩", "ポエム", "俳句", "短歌", "poem"),
+}
+
+def classify_by_keyword(text: str) -> str | None:
+    """キーワードが1つのルートだけに一致する場合はそのルートを返し、判定できない場合はNoneを返す"""
+    lowered = text.lower()
+    matches = [
+        step for step, keywords in ROUTE_KEYWORDS.items()
+        if any(keyword in lowered for keyword in keywords)
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+def llm_call_router(state: State):
+    """入力を適切なノードにルーティング"""
+    # キーワードで判定できない（該当なし・複数該当）場合のみLLMルーターを使う
+    decision = classify_by_keyword(state["input"]) or route_input(state["input"])
+    return {"decision": decision}
 
 # 適切なノードにルーティングする条件付きエッジ関数
 def route_decision(state: State):
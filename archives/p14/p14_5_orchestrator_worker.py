@@ -3,20 +3,20 @@ import operator
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Send
+from langgraph.config import get_stream_writer
 from langchain.messages import SystemMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
-from langchain.chat_models import init_chat_model
-import os
-from dotenv import load_dotenv
+from functools import lru_cache
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+from _llm import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：", MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+llm = get_llm()
 
 # 計画に使用する構造化出力のスキーマ
 class Section(BaseModel):
@@ -29,41 +29,73 @@ class Sections(BaseModel):
 # 構造化出力スキーマでLLMを拡張
 planner = llm.with_structured_output(Sections)
 
+PLANNER_PROMPT = "レポートの計画を生成してください。"
+# 計画のキャッシュファイル（同じモデル・プロンプト・トピックならプランナーを呼ばずに再利用）
+PLAN_CACHE_PATH = Path(__file__).with_name(".plan_cache.json")
+
+@lru_cache(maxsize=128)
+def plan_sections(topic: str) -> tuple[Section, ...]:
+    """トピックからレポートの計画を生成（キャッシュがあれば再利用）"""
+    key = hashlib.sha256(f"{MODEL_NAME}\n{PLANNER_PROMPT}\n{topic}".encode("utf-8")).hexdigest()
+    cache = json.loads(PLAN_CACHE_PATH.read_text(encoding="utf-8")) if PLAN_CACHE_PATH.exists() else {}
+    if key in cache:
+        return tuple(Section(**section) for section in cache[key])
+
+    report_sections = planner.invoke([
+        SystemMessage(content=PLANNER_PROMPT),
+        HumanMessage(content=f"レポートのトピックは次のとおりです: {topic}"),
+    ])
+    cache[key] = [section.model_dump() for section in report_sections.sections]
+    PLAN_CACHE_PATH.write_text(json.dumps(cache, ensure_ascii=False, indent=2), encoding="utf-8")
+    return tuple(report_sections.sections)
+
+# ワーカー共通のプロンプト（モジュールで1回だけ作り、全ワーカーで使い回す）
+# システムメッセージを先頭に固定し、可変部分（セクション名・説明）を末尾に置く
+section_prompt = ChatPromptTemplate.from_messages([
+    ("system", "提供された名前と説明に従ってレポートセクションを書いてください。各セクションに前書きを含めないでください。マークダウン形式を使用してください。"),
+    ("human", "セクション名: {name}、説明: {description}"),
+])
+section_writer = section_prompt | llm
+
+# ワーカーの同時実行数の上限（APIのレート制限を超えないようにする）
+MAX_CONCURRENT_WORKERS = 8
+worker_semaphore = asyncio.Semaphore(MAX_CONCURRENT_WORKERS)
+
 # グラフの状態
 class State(TypedDict):
     topic: str  # レポートのトピック
     sections: list[Section]  # レポートセクションのリスト
-    completed_sections: Annotated[list, operator.add]  # すべてのワーカーが並列にこのキーに書き込む
+    # すべてのワーカーが並列にこのキーに書き込む
+    # operator.add は書き込みのたびにリスト全体をコピーするので、iadd で既存のリストに追記する
+    completed_sections: Annotated[list, operator.iadd]
     final_report: str  # 最終レポート
 
 # ワーカーの状態
 class WorkerState(TypedDict):
     section: Section
-    completed_sections: Annotated[list, operator.add]
+    completed_sections: Annotated[list, operator.iadd]
 
 # ノード
 def orchestrator(state: State):
     """レポートの計画を生成するオーケストレーター"""
-    # クエリを生成
-    report_sections = planner.invoke([
-        SystemMessage(content="レポートの計画を生成してください。"),
-        HumanMessage(content=f"レポートのトピックは次のとおりです: {state['topic']}"),
-    ])
-    return {"sections": report_sections.sections}
+    return {"sections": list(plan_sections(state["topic"]))}
 
-def llm_call(state: WorkerState):
+async def llm_call(state: WorkerState):
     """ワーカーがレポートのセクションを書く"""
-    # セクションを生成
-    section = llm.invoke([
-        SystemMessage(
-            content="提供された名前と説明に従ってレポートセクションを書いてください。各セクションに前書きを含めないでください。マークダウン形式を使用してください。"
-        ),
-        HumanMessage(
-            content=f"セクション名: {state['section'].name}、説明: {state['section'].description}"
-        ),
-    ])
+    writer = get_stream_writer()
+    name = state["section"].name
+    # セクションを生成（同時実行数はセマフォで制限）
+    # トークンは生成されるたびにカスタムストリームへ流す
+    parts = []
+    async with worker_semaphore:
+        async for chunk in section_writer.astream({
+            "name": name,
+            "description": state["section"].description,
+        }):
+            writer({"section": name, "token": chunk.content})
+            parts.append(chunk.content)
     # 更新されたセクションを完了したセクションに書き込む
-    return {"completed_sections": [section.content]}
+    return {"completed_sections": ["".join(parts)]}
 
 def synthesizer(state: State):
     """セクションから完全なレポートを統合"""
@@ -97,6 +129,23 @@ orchestrator_worker_builder.add_edge("synthesizer", END)
 orchestrator_worker = orchestrator_worker_builder.compile()
 
 # 実行
-state = orchestrator_worker.invoke({"topic": "人工知能の歴史と未来"})
+async def main():
+    """各セクションの生成状況を表示しながらレポートを作成"""
+    started_sections = set()
+    final_report = ""
+    async for mode, chunk in orchestrator_worker.astream(
+        {"topic": "人工知能の歴史と未来"},
+        stream_mode=["updates", "custom"],
+    ):
+        if mode == "custom":
+            # 最初のトークンが届いた時点でセクションの生成開始を表示
+            if chunk["section"] not in started_sections:
+                started_sections.add(chunk["section"])
+                print(f"セクション生成開始: {chunk['section']}")
+        elif "synthesizer" in chunk:
+            final_report = chunk["synthesizer"]["final_report"]
+    return final_report
+
+final_report = asyncio.run(main())
 print("="*50)
-print(state["final_report"])
+print(final_report)
\ No newline at end of file
@@ -1,18 +1,14 @@
+from typing import Optional
 from typing_extensions import Literal, TypedDict
 from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
-import os
-from dotenv import load_dotenv
+from langgraph.config import get_stream_writer
+import asyncio
+from _llm import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：", MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+llm = get_llm()
 
 # グラフの状態
 class State(TypedDict):
@@ -29,31 +25,47 @@ class Feedback(BaseModel):
     feedback: str = Field(
         description="ジョークが面白くない場合、改善方法についてフィードバックを提供してください。"
     )
+    improved_joke: Optional[str] = Field(
+        None, description="ジョークが面白くない場合、フィードバックを反映した改善版のジョークを書いてください。"
+    )
 
 # 構造化出力スキーマでLLMを拡張
 evaluator = llm.with_structured_output(Feedback)
 
+# 評価結果はキャッシュしない（改善版が元のジョークと同じだったり、以前のジョークに戻ったりすると、
+# キャッシュされた "not funny" が返り続けて評価ループが終わらなくなるため）
+def evaluate_joke(topic: str, joke: str) -> Feedback:
+    """ジョークを評価し、面白くない場合は改善版も1回の呼び出しで受け取る"""
+    return evaluator.invoke(
+        f"{topic}についての次のジョークを評価してください。面白くない場合は、フィードバックを反映した改善版のジョークも返してください: {joke}"
+    )
+
 # ノード
-def llm_call_generator(state: State):
-    """LLMがジョークを生成"""
-    if state.get("feedback"):
-        msg = llm.invoke(
-            f"{state['topic']}についてジョークを書いてください。ただし、フィードバックを考慮してください: {state['feedback']}"
-        )
-    else:
-        msg = llm.invoke(f"{state['topic']}についてジョークを書いてください")
-    return {"joke": msg.content}
+async def llm_call_generator(state: State):
+    """LLMがジョークを生成（トークンはカスタムストリームへ逐次流す）"""
+    # 生成はSTARTからの1回だけ（改善は評価ノード側で行う）
+    prompt = f"{state['topic']}についてジョークを書いてください"
+    writer = get_stream_writer()
+    parts = []
+    async for chunk in llm.astream(prompt):
+        writer(chunk.content)
+        parts.append(chunk.content)
+    return {"joke": "".join(parts)}
 
 def llm_call_evaluator(state: State):
-    """LLMがジョークを評価"""
-    grade = evaluator.invoke(f"ジョークを評価してください {state['joke']}")
-    print("="*50)
-    print("funny_or_not:", grade.grade, "feedback:", grade.feedback)
-    return {"funny_or_not": grade.grade, "feedback": grade.feedback}
+    """LLMがジョークを評価し、面白くない場合は改善版に差し替える"""
+    grade = evaluate_joke(state["topic"], state["joke"])
+    update = {"funny_or_not": grade.grade, "feedback": grade.feedback}
+    if grade.grade == "not funny":
+        # 改善版が返されなかった場合のみ、フィードバックを反映して再生成
+        update["joke"] = grade.improved_joke or llm.invoke(
+            f"{state['topic']}についてジョークを書いてください。ただし、フィードバックを考慮してください: {grade.feedback}"
+        ).content
+    return update
 
-# 評価者のフィードバックに基づいてジョーク生成器にルーティングするか、終了する条件付きエッジ関数
+# 評価者のフィードバックに基づいて改善版を再評価するか、終了する条件付きエッジ関数
 def route_joke(state: State):
-    """評価者のフィードバックに基づいてジョーク生成器にルーティングするか、終了する"""
+    """評価者のフィードバックに基づいて改善版を再評価するか、終了する"""
     if state["funny_or_not"] == "funny":
         return "Accepted"
     elif state["funny_or_not"] == "not funny":
@@ -72,7 +84,7 @@ optimizer_builder.add_conditional_edges(
     route_joke,
     {  # route_jokeが返す名前: 次に訪問するノード名
         "Accepted": END,
-        "Rejected + Feedback": "llm_call_generator",
+        "Rejected + Feedback": "llm_call_evaluator",  # 改善版のジョークを再評価
     },
 )
 
@@ -80,7 +92,28 @@ optimizer_builder.add_conditional_edges(
 optimizer_workflow = optimizer_builder.compile()
 
 # 実行
-state = optimizer_workflow.invoke({"topic": "プログラミング"})
+async def main():
+    """生成中のジョークをトークン単位で表示しながら評価ループを実行"""
+    state = {}
+    async for mode, chunk in optimizer_workflow.astream(
+        {"topic": "プログラミング"},
+        stream_mode=["updates", "custom"],
+    ):
+        if mode == "custom":
+            # 生成中のジョークのトークンを逐次表示
+            print(chunk, end="", flush=True)
+        else:
+            for node_name, update in chunk.items():
+                if node_name == "llm_call_evaluator":
+                    print()
+                    print("="*50)
+                    print("funny_or_not:", update["funny_or_not"], "feedback:", update["feedback"])
+                    if "joke" in update:
+                        print("improved_joke:", update["joke"])
+                state.update(update)
+    return state
+
+state = asyncio.run(main())
 print("="*50)
 print("生成されたジョーク:")
 print(state["joke"])
@@ -0,0 +1,37 @@
+"""
+LLMトークン表示用のバッファ付きライター
+
+トークンごとに print(..., flush=True) すると、1トークンごとに stdout への
+書き込みとフラッシュが発生します。TokenWriter はトークンを少しだけ溜めて、
+一定数（デフォルト8個）または一定時間（デフォルト約16ms）ごとにまとめて書き出します。
+"""
+
+import sys
+import time
+
+
+class TokenWriter:
+    """トークンをまとめて stdout に書き出すライター"""
+
+    def __init__(self, max_tokens: int = 8, max_interval: float = 0.016):
+        self.max_tokens = max_tokens
+        self.max_interval = max_interval
+        self._buf: list[str] = []
+        self._last_flush = time.monotonic()
+        # print() の引数処理を通さず、stdout のメソッドを直接呼ぶ
+        self._write = sys.stdout.write
+        self._flush = sys.stdout.flush
+
+    def write(self, text: str) -> None:
+        """トークンをバッファに追加し、溜まったら書き出す"""
+        self._buf.append(text)
+        if len(self._buf) >= self.max_tokens or time.monotonic() - self._last_flush > self.max_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """溜まっているトークンをすべて書き出す（他の print の前に呼ぶ）"""
+        if self._buf:
+            self._write("".join(self._buf))
+            self._buf.clear()
+        self._flush()
+        self._last_flush = time.monotonic()
\ No newline at end of file
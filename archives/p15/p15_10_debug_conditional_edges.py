@@ -12,18 +12,13 @@ from typing_extensions import TypedDict, Literal
 from langgraph.graph import StateGraph, START, END
 from langchain.messages import HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
-from langchain.chat_models import init_chat_model
-import os
-from dotenv import load_dotenv
+from functools import lru_cache
+import asyncio
+from _client import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：", MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+llm = get_llm()
 
 # ルーティングロジックとして使用する構造化出力のスキーマ
 class Route(BaseModel):
@@ -56,14 +51,23 @@ def llm_call_3(state: State):
     result = llm.invoke(state["input"])
     return {"output": result.content}
 
-def llm_call_router(state: State):
-    """入力を適切なノードにルーティング"""
+ROUTER_PROMPT = "ユーザーのリクエストに基づいて、ストーリー、ジョーク、または詩にルーティングしてください。"
+# システムメッセージは内容が固定なので、毎回作らずに使い回す
+SYS_ROUTER = SystemMessage(content=ROUTER_PROMPT)
+
+@lru_cache(maxsize=1024)
+def route_input(text: str) -> str:
+    """入力文字列からルーティング先を判定（同じ入力の判定結果はキャッシュして再利用）"""
     # ルーティングロジックとして機能する構造化出力で拡張LLMを実行
     decision = router.invoke([
-        SystemMessage(content="ユーザーのリクエストに基づいて、ストーリー、ジョーク、または詩にルーティングしてください。"),
-        HumanMessage(content=state["input"]),
+        SYS_ROUTER,
+        HumanMessage(content=text),
     ])
-    return {"decision": decision.step}
+    return decision.step
+
+def llm_call_router(state: State):
+    """入力を適切なノードにルーティング"""
+    return {"decision": route_input(state["input"])}
 
 # 適切なノードにルーティングする条件付きエッジ関数
 def route_decision(state: State):
@@ -100,6 +104,66 @@ router_builder.add_edge("llm_call_3", END)
 # ワークフローをコンパイル
 router_workflow = router_builder.compile()
 
+# 条件付きエッジによる遷移を表すtriggerの接頭辞（例: 'branch:to:llm_call_1'）
+BRANCH_TRIGGER_PREFIX = "branch:to:"
+
+
+def format_debug_event(chunk: dict) -> list[str]:
+    """debugモードのイベント1件を表示用の行に変換"""
+    lines = []
+    event_type = chunk.get("type")
+    step = chunk.get("step")
+    payload = chunk.get("payload", {})
+    node_name = payload.get("name", "")
+    
+    if event_type == "task":
+        lines.append(f"\n[ステップ {step}] ノード '{node_name}' の実行開始")
+        triggers = payload.get("triggers", [])
+        if triggers:
+            lines.append(f"  Triggers: {triggers}")
+            # 条件付きエッジの判定結果を抽出
+            for trigger in triggers:
+                if isinstance(trigger, str) and trigger.startswith(BRANCH_TRIGGER_PREFIX):
+                    next_node = trigger[len(BRANCH_TRIGGER_PREFIX):]
+                    lines.append(f"  → 条件付きエッジの判定結果: '{next_node}' に遷移")
+    
+    elif event_type == "task_result":
+        lines.append(f"[ステップ {step}] ノード '{node_name}' の実行完了")
+        result = payload.get("result", {})
+        if "decision" in result:
+            lines.append(f"  判定結果: {result['decision']}")
+        if "output" in result:
+            output_preview = result["output"][:100] + "..." if len(result["output"]) > 100 else result["output"]
+            lines.append(f"  出力: {output_preview}")
+    return lines
+
+
+async def run_debug_case(input_text: str) -> list[str]:
+    """1件の入力をdebugモードで実行し、表示する行をまとめて返す"""
+    lines = []
+    async for chunk in router_workflow.astream(
+        {"input": input_text, "decision": "", "output": ""},
+        stream_mode="debug"
+    ):
+        lines.extend(format_debug_event(chunk))
+    return lines
+
+
+async def run_debug_cases(cases: list[tuple[str, str]]) -> None:
+    """複数のテストケースを並列に実行し、ケースごとにまとめて表示"""
+    # 各ケースのLLM呼び出しは互いに独立しているので同時に実行する
+    results = await asyncio.gather(*(run_debug_case(input_text) for _, input_text in cases))
+    for i, ((title, input_text), lines) in enumerate(zip(cases, results)):
+        if i > 0:
+            print("\n" + "=" * 80)
+            print(f"[テストケース{i + 1}] {title}")
+        else:
+            print(f"\n[テストケース{i + 1}] {title}")
+        print(f"入力: '{input_text}'")
+        print("-" * 80)
+        for line in lines:
+            print(line)
+
 
 if __name__ == "__main__":
     print("\n" + "=" * 80)
@@ -109,72 +173,12 @@ if __name__ == "__main__":
     print("triggersに'branch:to:ノード名'という形式で含まれます。")
     print("\n" + "-" * 80)
     
-    # テストケース1: ストーリーを生成
-    print("\n[テストケース1] ストーリーを生成")
-    print("入力: '飴ちゃんを主題にしたストーリー'")
-    print("-" * 80)
-    
-    for chunk in router_workflow.stream(
-        {"input": "飴ちゃんを主題にしたストーリー", "decision": "", "output": ""},
-        stream_mode="debug"
-    ):
-        event_type = chunk.get("type")
-        step = chunk.get("step")
-        payload = chunk.get("payload", {})
-        node_name = payload.get("name", "")
-        
-        if event_type == "task":
-            print(f"\n[ステップ {step}] ノード '{node_name}' の実行開始")
-            triggers = payload.get("triggers", [])
-            if triggers:
-                print(f"  Triggers: {triggers}")
-                # 条件付きエッジの判定結果を抽出
-                for trigger in triggers:
-                    if "branch:to:" in str(trigger):
-                        next_node = str(trigger).split("branch:to:")[-1].rstrip("'")
-                        print(f"  → 条件付きエッジの判定結果: '{next_node}' に遷移")
-        
-        elif event_type == "task_result":
-            print(f"[ステップ {step}] ノード '{node_name}' の実行完了")
-            result = payload.get("result", {})
-            if "decision" in result:
-                print(f"  判定結果: {result['decision']}")
-            if "output" in result:
-                output_preview = result["output"][:100] + "..." if len(result["output"]) > 100 else result["output"]
-                print(f"  出力: {output_preview}")
-    
-    print("\n" + "=" * 80)
-    print("[テストケース2] ジョークを生成")
-    print("入力: 'プログラミングについて面白いジョーク'")
-    print("-" * 80)
-    
-    for chunk in router_workflow.stream(
-        {"input": "プログラミングについて面白いジョーク", "decision": "", "output": ""},
-        stream_mode="debug"
-    ):
-        event_type = chunk.get("type")
-        step = chunk.get("step")
-        payload = chunk.get("payload", {})
-        node_name = payload.get("name", "")
-        
-        if event_type == "task":
-            print(f"\n[ステップ {step}] ノード '{node_name}' の実行開始")
-            triggers = payload.get("triggers", [])
-            if triggers:
-                print(f"  Triggers: {triggers}")
-                for trigger in triggers:
-                    if "branch:to:" in str(trigger):
-                        next_node = str(trigger).split("branch:to:")[-1].rstrip("'")
-                        print(f"  → 条件付きエッジの判定結果: '{next_node}' に遷移")
-        
-        elif event_type == "task_result":
-            print(f"[ステップ {step}] ノード '{node_name}' の実行完了")
-            result = payload.get("result", {})
-            if "decision" in result:
-                print(f"  判定結果: {result['decision']}")
-            if "output" in result:
-                output_preview = result["output"][:100] + "..." if len(result["output"]) > 100 else result["output"]
-                print(f"  出力: {output_preview}")
+    asyncio.run(run_debug_cases([
+        # テストケース1: ストーリーを生成
+        ("ストーリーを生成", "飴ちゃんを主題にしたストーリー"),
+        # テストケース2: ジョークを生成
+        ("ジョークを生成", "プログラミングについて面白いジョーク"),
+    ]))
     
     print("\n" + "=" * 80)
     print("【まとめ】")
@@ -8,20 +8,13 @@ stream_mode="updates"を使用して、各ノード後のグラフ状態の更
 """
 
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
-from langchain.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
 from typing import TypedDict
-import os
-from dotenv import load_dotenv
+from _client import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：", MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+llm = get_llm()
 
 
 class State(TypedDict):
@@ -29,16 +22,21 @@ class State(TypedDict):
     joke: str
 
 
+# プロンプトはテンプレートとして一度だけ作成し、LLMとつないだチェーンを各ノードで使い回す
+refine_chain = ChatPromptTemplate.from_messages([
+    ("system", "あなたはトピックを面白く精緻化する専門家です。"),
+    ("human", "以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {topic}"),
+]) | llm
+
+joke_chain = ChatPromptTemplate.from_messages([
+    ("system", "あなたは面白いジョークを生成するコメディアンです。"),
+    ("human", "以下のトピックについて、面白いジョークを1つ生成してください。\n\nトピック: {topic}"),
+]) | llm
+
+
 def refine_topic(state: State):
     """トピックを精緻化するノード（LLMを使用）"""
-    prompt = f"以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {state['topic']}"
-    
-    messages = [
-        SystemMessage(content="あなたはトピックを面白く精緻化する専門家です。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
+    response = refine_chain.invoke({"topic": state["topic"]})
     refined_topic = response.content.strip()
     
     return {"topic": refined_topic}
@@ -46,14 +44,7 @@ def refine_topic(state: State):
 
 def generate_joke(state: State):
     """ジョークを生成するノード（LLMを使用）"""
-    prompt = f"以下のトピックについて、面白いジョークを1つ生成してください。\n\nトピック: {state['topic']}"
-    
-    messages = [
-        SystemMessage(content="あなたは面白いジョークを生成するコメディアンです。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
+    response = joke_chain.invoke({"topic": state["topic"]})
     joke = response.content.strip()
     
     return {"joke": joke}
@@ -83,7 +74,7 @@ if __name__ == "__main__":
         {"topic": "アイスクリーム"},
         stream_mode="updates",  # 各ノード後のグラフ状態の更新のみをストリーム
     ):
-        node_name = list(chunk.keys())[0]
+        node_name = next(iter(chunk))
         update = chunk[node_name]
         print(f"\n[ノード: {node_name}]")
         for key, value in update.items():
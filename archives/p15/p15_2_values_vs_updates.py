@@ -6,20 +6,13 @@ values vs updates の違いを比較する例
 """
 
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
-from langchain.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
 from typing import TypedDict
-import os
-from dotenv import load_dotenv
+from _client import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：", MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+llm = get_llm()
 
 
 class State(TypedDict):
@@ -28,16 +21,21 @@ class State(TypedDict):
     step_count: int
 
 
+# プロンプトはテンプレートとして一度だけ作成し、LLMとつないだチェーンを各ノードで使い回す
+refine_chain = ChatPromptTemplate.from_messages([
+    ("system", "あなたはトピックを面白く精緻化する専門家です。"),
+    ("human", "以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {topic}"),
+]) | llm
+
+joke_chain = ChatPromptTemplate.from_messages([
+    ("system", "あなたは面白いジョークを生成するコメディアンです。"),
+    ("human", "以下のトピックについて、面白いジョークを1つ生成してください。\n\nトピック: {topic}"),
+]) | llm
+
+
 def refine_topic(state: State):
     """トピックを精緻化するノード（LLMを使用）"""
-    prompt = f"以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {state['topic']}"
-    
-    messages = [
-        SystemMessage(content="あなたはトピックを面白く精緻化する専門家です。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
+    response = refine_chain.invoke({"topic": state["topic"]})
     refined_topic = response.content.strip()
     
     return {
@@ -48,14 +46,7 @@ def refine_topic(state: State):
 
 def generate_joke(state: State):
     """ジョークを生成するノード（LLMを使用）"""
-    prompt = f"以下のトピックについて、面白いジョークを1つ生成してください。\n\nトピック: {state['topic']}"
-    
-    messages = [
-        SystemMessage(content="あなたは面白いジョークを生成するコメディアンです。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
+    response = joke_chain.invoke({"topic": state["topic"]})
     joke = response.content.strip()
     
     return {
@@ -87,7 +78,7 @@ if __name__ == "__main__":
     print("\n" + "-" * 80)
     
     for chunk in graph.stream(initial_state, stream_mode="updates"):
-        node_name = list(chunk.keys())[0]
+        node_name = next(iter(chunk))
         update = chunk[node_name]
         print(f"\n[ノード: {node_name}]")
         print(f"  更新内容: {update}")
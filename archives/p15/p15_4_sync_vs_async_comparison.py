@@ -6,63 +6,75 @@
 
 import asyncio
 import time
+from functools import lru_cache
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
-from langchain.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 from typing import TypedDict
-import os
-from dotenv import load_dotenv
+from _client import MODEL_NAME, aclose_clients, bounded_gather, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：", MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
-
 
 class State(TypedDict):
     topic: str
     joke: str
 
 
+# プロンプトはテンプレートとして一度だけ作成する（LLMとつないだチェーンは初回使用時に作成して使い回す）
+REFINE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "あなたはトピックを面白く精緻化する専門家です。"),
+    ("human", "以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {topic}"),
+])
+
+JOKE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "あなたは面白いジョークを生成するコメディアンです。"),
+    ("human", "以下のトピックについて、面白いジョークを1つ生成してください。\n\nトピック: {topic}"),
+])
+
+
+@lru_cache(maxsize=1)
+def refine_chain():
+    """トピック精緻化のチェーン（importしただけではLLMを作成しない）"""
+    return REFINE_PROMPT | get_llm()
+
+
+@lru_cache(maxsize=1)
+def joke_chain():
+    """ジョーク生成のチェーン（importしただけではLLMを作成しない）"""
+    return JOKE_PROMPT | get_llm()
+
+
 def refine_topic(state: State):
     """トピックを精緻化するノード（LLMを使用）"""
-    prompt = f"以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {state['topic']}"
-    
-    messages = [
-        SystemMessage(content="あなたはトピックを面白く精緻化する専門家です。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
-    refined_topic = response.content.strip()
-    
-    return {"topic": refined_topic}
+    response = refine_chain().invoke({"topic": state["topic"]})
+    return {"topic": response.content.strip()}
+
+
+async def arefine_topic(state: State):
+    """トピックを精緻化するノード（非同期版）"""
+    response = await refine_chain().ainvoke({"topic": state["topic"]})
+    return {"topic": response.content.strip()}
 
 
 def generate_joke(state: State):
     """ジョークを生成するノード（LLMを使用）"""
-    prompt = f"以下のトピックについて、面白いジョークを1つ生成してください。\n\nトピック: {state['topic']}"
-    
-    messages = [
-        SystemMessage(content="あなたは面白いジョークを生成するコメディアンです。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
-    joke = response.content.strip()
-    
-    return {"joke": joke}
+    response = joke_chain().invoke({"topic": state["topic"]})
+    return {"joke": response.content.strip()}
+
+
+async def agenerate_joke(state: State):
+    """ジョークを生成するノード（非同期版）"""
+    response = await joke_chain().ainvoke({"topic": state["topic"]})
+    return {"joke": response.content.strip()}
 
 
 # グラフの構築
 graph = (
     StateGraph(State)
-    .add_node("refine_topic", refine_topic)
-    .add_node("generate_joke", generate_joke)
+    # stream()では同期版、astream()では非同期版（ainvoke）が使われる
+    .add_node("refine_topic", RunnableLambda(refine_topic, afunc=arefine_topic))
+    .add_node("generate_joke", RunnableLambda(generate_joke, afunc=agenerate_joke))
     .add_edge(START, "refine_topic")
     .add_edge("refine_topic", "generate_joke")
     .add_edge("generate_joke", END)
@@ -82,9 +94,9 @@ def sync_streaming_example():
         {"topic": "プログラミング"},
         stream_mode="updates",
     ):
-        node_name = list(chunk.keys())[0]
-        update = chunk[node_name]
-        print(f"[ノード: {node_name}] {list(update.keys())[0]}: {str(list(update.values())[0])[:50]}...")
+        node_name, update = next(iter(chunk.items()))
+        key, value = next(iter(update.items()))
+        print(f"[ノード: {node_name}] {key}: {str(value)[:50]}...")
     
     elapsed = time.time() - start_time
     print(f"\n実行時間: {elapsed:.2f}秒")
@@ -102,9 +114,9 @@ async def async_streaming_example():
         {"topic": "プログラミング"},
         stream_mode="updates",
     ):
-        node_name = list(chunk.keys())[0]
-        update = chunk[node_name]
-        print(f"[ノード: {node_name}] {list(update.keys())[0]}: {str(list(update.values())[0])[:50]}...")
+        node_name, update = next(iter(chunk.items()))
+        key, value = next(iter(update.items()))
+        print(f"[ノード: {node_name}] {key}: {str(value)[:50]}...")
     
     elapsed = time.time() - start_time
     print(f"\n実行時間: {elapsed:.2f}秒")
@@ -124,18 +136,19 @@ async def async_parallel_example():
             {"topic": topic},
             stream_mode="updates",
         ):
-            node_name = list(chunk.keys())[0]
-            update = chunk[node_name]
+            node_name = next(iter(chunk))
             print(f"[タスク {task_id} - {node_name}] 完了")
         print(f"[タスク {task_id}] 完了: {topic}")
     
+    topics = ["プログラミング", "料理", "旅行"]
     start_time = time.time()
     
-    # 3つのタスクを並列実行
-    await asyncio.gather(
-        process_topic("プログラミング", 1),
-        process_topic("料理", 2),
-        process_topic("旅行", 3),
+    # 3つのタスクを並列実行（トピックが増えても同時実行数は上限までに抑える）
+    # 各タスクは refine_topic → generate_joke のパイプラインなので、
+    # 他のトピックの完了を待たずに、精緻化が終わったトピックから順にジョーク生成へ進む
+    await bounded_gather(
+        process_topic(topic, i)
+        for i, topic in enumerate(topics, 1)
     )
     
     elapsed = time.time() - start_time
@@ -159,8 +172,7 @@ def sync_sequential_example():
             {"topic": topic},
             stream_mode="updates",
         ):
-            node_name = list(chunk.keys())[0]
-            update = chunk[node_name]
+            node_name = next(iter(chunk))
             print(f"[タスク {i} - {node_name}] 完了")
         print(f"[タスク {i}] 完了: {topic}")
     
@@ -216,6 +228,14 @@ async def main():
     """)
 
 
+async def run():
+    """main()を実行し、終了時に共有HTTPクライアントを閉じる"""
+    try:
+        await main()
+    finally:
+        await aclose_clients()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
 
@@ -9,21 +9,16 @@ messagesモードでは、LLMが呼び出される任意のグラフノードか
 """
 
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
 from langchain.messages import HumanMessage, SystemMessage
 from typing import TypedDict, Annotated
 import operator
-import os
-from dotenv import load_dotenv
+from _token_writer import TokenWriter
+from _client import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：", MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+# システムメッセージは内容が固定なので、毎回作らずに使い回す
+SYS_ASSISTANT = SystemMessage(content="あなたは親切で知識豊富なアシスタントです。")
 
 
 class State(TypedDict):
@@ -34,10 +29,10 @@ def llm_node(state: State):
     """LLMを呼び出すノード"""
     # システムメッセージを追加（オプション）
     messages = [
-        SystemMessage(content="あなたは親切で知識豊富なアシスタントです。"),
+        SYS_ASSISTANT,
     ] + state["messages"]
     
-    response = llm.invoke(messages)
+    response = get_llm().invoke(messages)
     return {"messages": [response]}
 
 
@@ -61,17 +56,20 @@ if __name__ == "__main__":
     
     # LLMトークンをストリーム
     print("\n[ユーザー] プログラミングについて面白いジョークを教えてください。\n")
-    print("[AI] ", end="", flush=True)
     
+    # トークンはバッファに溜めて、まとめて表示する
+    token_writer = TokenWriter()
+    token_writer.write("[AI] ")
     for token, metadata in graph.stream(
         {"messages": [HumanMessage(content="プログラミングについて面白いジョークを教えてください。")]},
         stream_mode="messages",  # messagesモードでトークン単位のストリーミング
     ):
         # tokenはAIMessageオブジェクトなので、content属性からテキストを取得
         token_text = token.content if hasattr(token, 'content') else str(token)
-        # トークンを逐次表示（改行なし、即座にフラッシュ）
-        print(token_text, end="", flush=True)
+        # トークンを逐次表示（改行なし、数トークンごとにまとめてフラッシュ）
+        token_writer.write(token_text)
         # metadataにはノード名、LLM呼び出し情報などが含まれる
+    token_writer.flush()
     
     print("\n")  # 最後に改行
     print("-" * 80)
@@ -84,28 +82,36 @@ if __name__ == "__main__":
     print("-" * 80)
     
     print("\n[ユーザー] 短い詩を書いてください。\n")
-    print("[AI] ", end="", flush=True)
     
-    token_count = 0
+    is_first_token = True
+    usage = {}
+    token_writer = TokenWriter()
+    token_writer.write("[AI] ")
     for token, metadata in graph.stream(
         {"messages": [HumanMessage(content="AIについて短い詩を書いてください。")]},
         stream_mode="messages",
     ):
         # tokenはAIMessageオブジェクトなので、content属性からテキストを取得
         token_text = token.content if hasattr(token, 'content') else str(token)
-        print(token_text, end="", flush=True)
-        token_count += 1
+        token_writer.write(token_text)
+        # 最後のチャンクは使用量を持たない空のチャンクのことがあるので、空でない最新の使用量を保持する
+        if getattr(token, "usage_metadata", None):
+            usage = token.usage_metadata
         
         # 最初のトークンでメタデータを表示（デモ用）
-        if token_count == 1:
+        if is_first_token:
+            token_writer.flush()
             print("\n\n[メタデータの例]")
             print(f"  ノード名: {metadata.get('node', 'N/A')}")
             print(f"  メタデータ全体: {metadata}")
-            print("\n[AI] ", end="", flush=True)
+            token_writer.write("\n[AI] ")
+            is_first_token = False
+    token_writer.flush()
     
     print("\n")
     print("-" * 80)
-    print(f"\n総トークン数: {token_count}")
+    # トークン数は自分で数えず、ストリームで受け取った使用量（usage_metadata）から取得
+    print(f"\n総トークン数: {usage.get('output_tokens', 'N/A')}")
     print("=" * 80)
     print("\nストリーミング完了")
 
@@ -6,23 +6,40 @@
 より高度なストリーミング処理が可能になります。
 """
 
+import asyncio
+from functools import lru_cache
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
-from langchain.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
 from typing import TypedDict, Annotated
 import operator
-import os
-from dotenv import load_dotenv
-from collections import defaultdict
+from collections import Counter, defaultdict
+from _client import MODEL_NAME, get_llm
+from _token_writer import TokenWriter
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：", MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+# プロンプトはテンプレートとして一度だけ作成する（LLMとつないだチェーンは初回使用時に作成して使い回す）
+REFINE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "あなたはトピックを面白く精緻化する専門家です。"),
+    ("human", "以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {topic}"),
+])
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "あなたは要約を生成する専門家です。"),
+    ("human", "以下のトピックについて、短い要約を生成してください。\n\nトピック: {topic}"),
+])
+
+
+@lru_cache(maxsize=1)
+def refine_chain():
+    """トピック精緻化のチェーン（importしただけではLLMを作成しない）"""
+    return REFINE_PROMPT | get_llm()
+
+
+@lru_cache(maxsize=1)
+def summary_chain():
+    """要約生成のチェーン（importしただけではLLMを作成しない）"""
+    return SUMMARY_PROMPT | get_llm()
 
 
 class State(TypedDict):
@@ -31,31 +48,17 @@ class State(TypedDict):
     summary: str
 
 
-def refine_topic_node(state: State):
+async def refine_topic_node(state: State):
     """トピックを精緻化するノード"""
-    prompt = f"以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {state.get('topic', '')}"
-    
-    messages = [
-        SystemMessage(content="あなたはトピックを面白く精緻化する専門家です。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
+    response = await refine_chain().ainvoke({"topic": state.get('topic', '')})
     refined_topic = response.content.strip()
     
     return {"topic": refined_topic}
 
 
-def generate_summary_node(state: State):
+async def generate_summary_node(state: State):
     """要約を生成するノード"""
-    prompt = f"以下のトピックについて、短い要約を生成してください。\n\nトピック: {state.get('topic', '')}"
-    
-    messages = [
-        SystemMessage(content="あなたは要約を生成する専門家です。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
+    response = await summary_chain().ainvoke({"topic": state.get('topic', '')})
     summary = response.content.strip()
     
     return {"summary": summary}
@@ -72,39 +75,95 @@ graph = (
     .compile()
 )
 
+# 例1でメタデータを記録するトークン番号（最初、10番目、以降20トークンごと）
+SAMPLE_POINTS = {1, 10, 20, 40, 60, 80, 100}
 
-if __name__ == "__main__":
+
+def token_text_of(token) -> str:
+    """トークン（AIMessageChunk）からテキストを取得"""
+    return token.content if hasattr(token, 'content') else str(token)
+
+
+class Collector:
+    """1回のストリームから、例1〜例5の集計をまとめて行う"""
+    
+    def __init__(self, target_node: str):
+        self.target_node = target_node
+        self.token_count = 0
+        self.metadata_samples = []  # 例1: 指定位置のトークンのメタデータ
+        self.labeled_parts = []  # 例2: ノード名付きのトークン
+        self.node_names = []  # 例3: トークンごとのノード名（数は最後にまとめて数える）
+        self.node_texts = defaultdict(list)  # 例3: ノードごとのテキスト
+        self.target_tokens = []  # 例4: 特定のノードからのトークン
+        self.first_token_metadata = None  # 例5: 最初のトークンのメタデータ
+        self.final_state = None  # valuesモードで受け取った最後の状態
+    
+    def add_token(self, token, metadata) -> str:
+        """messagesモードのトークン1つを、すべての例の集計に反映する"""
+        token_text = token_text_of(token)
+        node_name = metadata.get("langgraph_node", "unknown")
+        self.token_count += 1
+        
+        # 例1: SAMPLE_POINTSの位置のトークンでメタデータを記録
+        if self.token_count in SAMPLE_POINTS:
+            label = "最初のトークン" if self.token_count == 1 else f"{self.token_count}番目のトークン"
+            # メタデータはストリーム側で書き換えられないので、コピーせずにそのまま保持する
+            self.metadata_samples.append((label, metadata))
+        
+        # 例2: 空白以外のトークンにノード名を付ける
+        if token_text and not token_text.isspace():
+            self.labeled_parts.append(f"[{node_name}] ")
+            self.labeled_parts.append(token_text)
+        
+        # 例3: ノードごとに集計
+        self.node_names.append(node_name)
+        self.node_texts[node_name].append(token_text)
+        
+        # 例4: 特定のノードからのトークンのみを処理（他のノードからのトークンは無視）
+        if node_name == self.target_node:
+            self.target_tokens.append(token_text)
+        
+        # 例5: 最初のトークンでメタデータの詳細を記録
+        if self.first_token_metadata is None:
+            self.first_token_metadata = metadata
+        return token_text
+
+
+async def main():
+    """グラフを1回だけ実行し、そのストリームから5つの例をまとめて表示"""
+    topic = "プログラミング"
+    collector = Collector(target_node="generate_summary")
+    
+    print("\n" + "=" * 80)
+    print("【ストリーミング】グラフを1回だけ実行し、例1〜例5の集計をまとめて行います")
+    print("=" * 80)
+    print(f"\n[ユーザー] {topic}について教えてください。\n")
+    
+    # トークンは届いた順にそのまま表示し、集計はCollectorがまとめて行う
+    token_writer = TokenWriter()
+    token_writer.write("[AI] ")
+    # messagesモードでトークンとメタデータ、valuesモードで最終状態を同時に受け取る
+    async for mode, chunk in graph.astream(
+        {"messages": [], "topic": topic, "summary": ""},
+        stream_mode=["messages", "values"],
+    ):
+        if mode == "messages":
+            token, metadata = chunk
+            token_writer.write(collector.add_token(token, metadata))
+        else:
+            collector.final_state = chunk
+    token_writer.write("\n")
+    token_writer.flush()
+    
     print("\n" + "=" * 80)
     print("【例1】メタデータが全トークンで同じかどうかを確認")
     print("=" * 80)
     print("\n各トークンのメタデータを確認して、同じ内容が設定されているか確認します。\n")
     print("-" * 80)
     
-    print("\n[ユーザー] プログラミングについて教えてください。\n")
-    print("[AI] ", end="", flush=True)
-    
-    metadata_samples = []
-    token_count = 0
-    
-    for token, metadata in graph.stream(
-        {"messages": [], "topic": "プログラミング", "summary": ""},
-        stream_mode="messages",
-    ):
-        token_text = token.content if hasattr(token, 'content') else str(token)
-        print(token_text, end="", flush=True)
-        token_count += 1
-        
-        # 最初、中間、最後のトークンでメタデータを記録
-        if token_count == 1:
-            metadata_samples.append(("最初のトークン", metadata.copy()))
-        elif token_count == 10:
-            metadata_samples.append(("10番目のトークン", metadata.copy()))
-        elif token_count % 20 == 0:  # 20トークンごと
-            metadata_samples.append((f"{token_count}番目のトークン", metadata.copy()))
-    
-    print("\n\n[メタデータの比較]")
+    print("\n[メタデータの比較]")
     print("-" * 80)
-    for label, meta in metadata_samples:
+    for label, meta in collector.metadata_samples:
         print(f"\n{label}:")
         print(f"  ノード名: {meta.get('langgraph_node', 'N/A')}")
         print(f"  メタデータキー: {list(meta.keys())}")
@@ -115,48 +174,19 @@ if __name__ == "__main__":
     print("\n複数のノードがある場合、どのノードからのトークンかを表示します。\n")
     print("-" * 80)
     
-    print("\n[処理開始]\n")
-    
-    for token, metadata in graph.stream(
-        {"messages": [], "topic": "AI", "summary": ""},
-        stream_mode="messages",
-    ):
-        token_text = token.content if hasattr(token, 'content') else str(token)
-        node_name = metadata.get("langgraph_node", "unknown")
-        
-        # ノード名を表示（最初のトークンのみ）
-        if token_text and not token_text.isspace():
-            print(f"[{node_name}] ", end="", flush=True)
-            print(token_text, end="", flush=True)
+    print("\n" + "".join(collector.labeled_parts))
     
-    print("\n\n" + "=" * 80)
+    print("\n" + "=" * 80)
     print("【例3】ノードごとにトークンを集計")
     print("=" * 80)
     print("\n各ノードから生成されたトークン数を集計します。\n")
     print("-" * 80)
     
-    print("\n[処理開始]\n")
-    
-    node_token_counts = defaultdict(int)
-    node_texts = defaultdict(str)
-    
-    for token, metadata in graph.stream(
-        {"messages": [], "topic": "機械学習", "summary": ""},
-        stream_mode="messages",
-    ):
-        token_text = token.content if hasattr(token, 'content') else str(token)
-        node_name = metadata.get("langgraph_node", "unknown")
-        
-        node_token_counts[node_name] += 1
-        node_texts[node_name] += token_text
-        
-        # トークンを表示
-        print(token_text, end="", flush=True)
-    
-    print("\n\n[集計結果]")
+    print("\n[集計結果]")
     print("-" * 80)
-    for node_name, count in node_token_counts.items():
-        text_preview = node_texts[node_name][:50] + "..." if len(node_texts[node_name]) > 50 else node_texts[node_name]
+    for node_name, count in Counter(collector.node_names).items():
+        full_text = "".join(collector.node_texts[node_name])
+        text_preview = full_text[:50] + "..." if len(full_text) > 50 else full_text
         print(f"\nノード: {node_name}")
         print(f"  トークン数: {count}")
         print(f"  テキスト（一部）: {text_preview}")
@@ -164,51 +194,21 @@ if __name__ == "__main__":
     print("\n" + "=" * 80)
     print("【例4】特定のノードからのトークンのみを処理")
     print("=" * 80)
-    print("\n特定のノード（例: generate_summary）からのトークンのみを表示します。\n")
+    print(f"\n特定のノード（例: {collector.target_node}）からのトークンのみを表示します。\n")
     print("-" * 80)
     
-    print("\n[処理開始]")
-    print("（refine_topicノードのトークンは表示しません）\n")
-    print("[generate_summary] ", end="", flush=True)
+    print("\n（refine_topicノードのトークンは表示しません）\n")
+    print(f"[{collector.target_node}] {''.join(collector.target_tokens)}")
     
-    target_node = "generate_summary"
-    
-    for token, metadata in graph.stream(
-        {"messages": [], "topic": "Python", "summary": ""},
-        stream_mode="messages",
-    ):
-        node_name = metadata.get("langgraph_node", "unknown")
-        
-        # 特定のノードからのトークンのみを処理
-        if node_name == target_node:
-            token_text = token.content if hasattr(token, 'content') else str(token)
-            print(token_text, end="", flush=True)
-        # 他のノードからのトークンは無視
-    
-    print("\n\n" + "=" * 80)
+    print("\n" + "=" * 80)
     print("【例5】メタデータの詳細情報を活用")
     print("=" * 80)
     print("\nメタデータに含まれる詳細情報（LLM呼び出し情報など）を活用します。\n")
     print("-" * 80)
     
-    print("\n[ユーザー] 短い説明を書いてください。\n")
-    print("[AI] ", end="", flush=True)
-    
-    first_token_metadata = None
-    
-    for token, metadata in graph.stream(
-        {"messages": [], "topic": "データサイエンス", "summary": ""},
-        stream_mode="messages",
-    ):
-        token_text = token.content if hasattr(token, 'content') else str(token)
-        print(token_text, end="", flush=True)
-        
-        # 最初のトークンでメタデータの詳細を記録
-        if first_token_metadata is None:
-            first_token_metadata = metadata
-    
-    print("\n\n[メタデータの詳細]")
+    print("\n[メタデータの詳細]")
     print("-" * 80)
+    first_token_metadata = collector.first_token_metadata
     if first_token_metadata:
         print(f"利用可能なキー: {list(first_token_metadata.keys())}")
         for key, value in first_token_metadata.items():
@@ -225,7 +225,16 @@ if __name__ == "__main__":
                     value_str = value_str[:100] + "..."
                 print(f"{key}: {value_str}")
     
+    if collector.final_state:
+        print("\n[最終状態（valuesモード）]")
+        print("-" * 80)
+        print(f"topic: {collector.final_state.get('topic', '')}")
+        print(f"summary: {collector.final_state.get('summary', '')}")
+    
     print("\n" + "=" * 80)
     print("ストリーミング完了")
     print("=" * 80)
 
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
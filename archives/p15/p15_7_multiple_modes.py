@@ -9,21 +9,16 @@ stream_mode=["updates", "messages"]を使用して、ノードの更新情報と
 """
 
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
 from langchain.messages import HumanMessage, SystemMessage
 from typing import TypedDict, Annotated
 import operator
-import os
-from dotenv import load_dotenv
+from _token_writer import TokenWriter
+from _client import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 print("モデル名：", MODEL_NAME)
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+# システムメッセージは内容が固定なので、毎回作らずに使い回す
+SYS_ASSISTANT = SystemMessage(content="あなたは親切で知識豊富なアシスタントです。")
 
 
 class State(TypedDict):
@@ -34,10 +29,10 @@ def llm_node(state: State):
     """LLMを呼び出すノード"""
     # システムメッセージを追加（オプション）
     messages = [
-        SystemMessage(content="あなたは親切で知識豊富なアシスタントです。"),
+        SYS_ASSISTANT,
     ] + state["messages"]
     
-    response = llm.invoke(messages)
+    response = get_llm().invoke(messages)
     return {"messages": [response]}
 
 
@@ -64,6 +59,7 @@ if __name__ == "__main__":
     # ノードの更新とLLMトークンを同時にストリーム
     update_count = 0
     token_count = 0
+    token_writer = TokenWriter()
     
     for mode, chunk in graph.stream(
         {"messages": [HumanMessage(content="プログラミングについて面白いジョークを教えてください。")]},
@@ -72,8 +68,8 @@ if __name__ == "__main__":
         if mode == "updates":
             # updatesモード: ノードの更新情報
             update_count += 1
-            node_name = list(chunk.keys())[0]
-            update = chunk[node_name]
+            token_writer.flush()  # 溜まっているトークンを先に表示
+            node_name, update = next(iter(chunk.items()))
             print(f"\n[Node Update #{update_count}]")
             print(f"  ノード名: {node_name}")
             print(f"  更新内容: {update}")
@@ -86,11 +82,12 @@ if __name__ == "__main__":
             # 最初のトークンで開始を表示
             if token_count == 1:
                 node_name = metadata.get("langgraph_node", "unknown")
-                print(f"\n[LLM Tokens from '{node_name}'] ", end="", flush=True)
+                token_writer.write(f"\n[LLM Tokens from '{node_name}'] ")
             
             # tokenはAIMessageオブジェクトなので、content属性からテキストを取得
             token_text = token.content if hasattr(token, 'content') else str(token)
-            print(token_text, end="", flush=True)
+            token_writer.write(token_text)
+    token_writer.flush()
     
     print("\n")  # 最後に改行
     print("-" * 80)
@@ -108,16 +105,18 @@ if __name__ == "__main__":
     
     update_events = []
     token_events = []
+    token_writer = TokenWriter()
     
     for mode, chunk in graph.stream(
         {"messages": [HumanMessage(content="AIについて短い説明を書いてください。")]},
         stream_mode=["updates", "messages"],
     ):
         if mode == "updates":
-            node_name = list(chunk.keys())[0]
+            token_writer.flush()  # 溜まっているトークンを先に表示
+            node_name, update = next(iter(chunk.items()))
             update_events.append({
                 "node": node_name,
-                "update": chunk[node_name]
+                "update": update
             })
             print(f"[UPDATE] ノード '{node_name}' が実行されました")
         
@@ -129,7 +128,8 @@ if __name__ == "__main__":
                 "node": metadata.get("langgraph_node", "unknown")
             })
             # トークンは連続して表示
-            print(token_text, end="", flush=True)
+            token_writer.write(token_text)
+    token_writer.flush()
     
     print("\n\n" + "-" * 80)
     print(f"\n[詳細な集計]")
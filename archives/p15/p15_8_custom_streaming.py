@@ -10,7 +10,7 @@ get_stream_writer()を使用して、ノード内から進行状況をストリ
 from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, START, END
 from typing import TypedDict
-import time
+import asyncio
 
 
 class TaskState(TypedDict):
@@ -20,24 +20,31 @@ class TaskState(TypedDict):
     total_items: int
 
 
-def process_items(state: TaskState):
+async def process_items(state: TaskState):
     """アイテムを処理し、進行状況をカスタムストリームで報告するノード"""
     writer = get_stream_writer()
     total = state["total_items"]
+    done = 0
     
-    for i in range(total):
+    async def process_one(i: int):
+        """1つのアイテムを処理し、完了したら進行状況をストリーム"""
+        nonlocal done
         # アイテムの処理（シミュレーション）
-        time.sleep(0.1)  # 処理のシミュレーション
+        await asyncio.sleep(0.1)  # 処理のシミュレーション
+        done += 1
         
         # 進行状況をストリーム
         if writer:
-            progress = int((i + 1) / total * 100)
+            progress = int(done / total * 100)
             writer({
                 "progress": progress,
-                "items_processed": i + 1,
-                "status": f"Processing item {i + 1}/{total}"
+                "items_processed": done,
+                "status": f"Processing item {done}/{total}"
             })
     
+    # アイテム同士は独立しているので、すべて並列に処理する
+    await asyncio.gather(*(process_one(i) for i in range(total)))
+    
     return {
         "status": "completed",
         "items_processed": total
@@ -54,40 +61,42 @@ graph = (
 )
 
 
-if __name__ == "__main__":
+async def main():
+    """進行状況をストリームし、同じ実行の最終状態を確認"""
     print("カスタムデータストリーミング: 進行状況の報告")
     print("=" * 60)
     print("\n[モード: custom] 処理の進行状況をリアルタイムでストリーム")
     print("-" * 60)
     
-    # 進行状況を監視
-    for chunk in graph.stream(
+    # 進行状況を監視（valuesモードも同時に受け取り、最後の状態を最終状態として使う）
+    final_state = None
+    async for mode, chunk in graph.astream(
         {
             "task_id": "task_1",
             "status": "pending",
             "items_processed": 0,
             "total_items": 10
         },
-        stream_mode="custom",
+        stream_mode=["custom", "values"],
     ):
-        progress = chunk.get("progress", 0)
-        items_processed = chunk.get("items_processed", 0)
-        status = chunk.get("status", "")
-        print(f"[{progress:3d}%] {status} (処理済み: {items_processed}件)")
+        if mode == "custom":
+            progress = chunk.get("progress", 0)
+            items_processed = chunk.get("items_processed", 0)
+            status = chunk.get("status", "")
+            print(f"[{progress:3d}%] {status} (処理済み: {items_processed}件)")
+        else:
+            final_state = chunk
     
     print("\n" + "=" * 60)
     print("ストリーミング完了")
     
-    # 最終状態を確認
-    final_state = graph.invoke({
-        "task_id": "task_1",
-        "status": "pending",
-        "items_processed": 0,
-        "total_items": 10
-    })
+    # 最終状態を確認（グラフを再実行せず、ストリーム中に受け取った状態を使う）
     print(f"\n最終状態:")
     print(f"  task_id: {final_state['task_id']}")
     print(f"  status: {final_state['status']}")
     print(f"  items_processed: {final_state['items_processed']}")
     print(f"  total_items: {final_state['total_items']}")
 
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,24 +6,27 @@ updates vs debug の違いを比較する例
 
 debugモードは、可能な限り多くの情報（ノード名、完全な状態、実行フローなど）
 をストリームしますが、LLMトークンは含まれません。
+ここでは、debugモードのうちノードの実行開始・完了イベントだけを
+ラッパーなしで受け取れる"tasks"モードを使います。
 """
 
+import asyncio
+import os
+from collections import deque
+from itertools import islice
+from functools import lru_cache
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
-from langchain.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
 from typing import TypedDict
-import os
-import json
-from dotenv import load_dotenv
+from _client import MODEL_NAME, get_llm
 
-load_dotenv()
-MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-print("モデル名：", MODEL_NAME)
+# DEMO_TRACE=1 のときだけLangSmithのトレースを有効にする
+# （.envでトレースが有効になっていても、ノードのイベントごとのトレース送信を行わない）
+if os.getenv("DEMO_TRACE") != "1":
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
 
-llm = init_chat_model(
-    MODEL_NAME,
-    temperature=0
-)
+print("モデル名：", MODEL_NAME)
 
 
 class State(TypedDict):
@@ -32,16 +35,33 @@ class State(TypedDict):
     step_count: int
 
 
-def refine_topic(state: State):
+# プロンプトはテンプレートとして一度だけ作成する（LLMとつないだチェーンは初回使用時に作成して使い回す）
+REFINE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "あなたはトピックを面白く精緻化する専門家です。"),
+    ("human", "以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {topic}"),
+])
+
+JOKE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "あなたは面白いジョークを生成するコメディアンです。"),
+    ("human", "以下のトピックについて、面白いジョークを1つ生成してください。\n\nトピック: {topic}"),
+])
+
+
+@lru_cache(maxsize=1)
+def refine_chain():
+    """トピック精緻化のチェーン（importしただけではLLMを作成しない）"""
+    return REFINE_PROMPT | get_llm()
+
+
+@lru_cache(maxsize=1)
+def joke_chain():
+    """ジョーク生成のチェーン（importしただけではLLMを作成しない）"""
+    return JOKE_PROMPT | get_llm()
+
+
+async def refine_topic(state: State):
     """トピックを精緻化するノード（LLMを使用）"""
-    prompt = f"以下のトピックを、より面白く魅力的なトピックに精緻化してください。簡潔に1文で答えてください。\n\nトピック: {state['topic']}"
-    
-    messages = [
-        SystemMessage(content="あなたはトピックを面白く精緻化する専門家です。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
+    response = await refine_chain().ainvoke({"topic": state["topic"]})
     refined_topic = response.content.strip()
     
     return {
@@ -50,16 +70,9 @@ def refine_topic(state: State):
     }
 
 
-def generate_joke(state: State):
+async def generate_joke(state: State):
     """ジョークを生成するノード（LLMを使用）"""
-    prompt = f"以下のトピックについて、面白いジョークを1つ生成してください。\n\nトピック: {state['topic']}"
-    
-    messages = [
-        SystemMessage(content="あなたは面白いジョークを生成するコメディアンです。"),
-        HumanMessage(content=prompt)
-    ]
-    
-    response = llm.invoke(messages)
+    response = await joke_chain().ainvoke({"topic": state["topic"]})
     joke = response.content.strip()
     
     return {
@@ -80,24 +93,105 @@ graph = (
 )
 
 
-def format_debug_chunk(chunk):
-    """debugモードのチャンクを読みやすくフォーマット"""
-    if isinstance(chunk, dict):
-        formatted = {}
-        for key, value in chunk.items():
-            if isinstance(value, dict):
-                formatted[key] = format_debug_chunk(value)
-            elif isinstance(value, str) and len(value) > 100:
-                formatted[key] = value[:100] + "..."
+def format_update_chunk(update_count: int, chunk: dict) -> list[str]:
+    """updatesモードのチャンク1件を表示用の行に変換"""
+    lines = []
+    node_name = next(iter(chunk))
+    update = chunk[node_name]
+    lines.append(f"\n[更新 #{update_count}] ノード: {node_name}")
+    for key, value in update.items():
+        if isinstance(value, str) and len(value) > 80:
+            display_value = value[:80] + "..."
+            lines.append(f"  {key}: {display_value}")
+        else:
+            lines.append(f"  {key}: {value}")
+    lines.append(f"  → このノードで変更されたフィールドのみが表示される")
+    return lines
+
+
+def format_task_event(task_count: int, chunk: dict) -> list[str]:
+    """tasksモードのチャンク1件を表示用の行に変換"""
+    lines = []
+    # tasksモードの構造:
+    #   実行開始: {id, name, input, triggers}
+    #   実行完了: {id, name, error, result, interrupts}
+    node_name = chunk.get("name", "unknown")
+    
+    if "input" in chunk:
+        # ノードの実行開始
+        lines.append(f"\n[タスク情報 #{task_count}] ノード実行開始")
+        lines.append(f"  ノード名: {node_name}")
+        lines.append(f"  トリガー: {list(chunk.get('triggers', []))}")
+        input_data = chunk["input"]
+        lines.append(f"  入力データのキー: {list(input_data.keys())}")
+        # 入力データの一部を表示
+        for key, value in islice(input_data.items(), 2):
+            if isinstance(value, str) and len(value) > 60:
+                lines.append(f"    {key}: {value[:60]}...")
             else:
-                formatted[key] = value
-        return formatted
-    return chunk
+                lines.append(f"    {key}: {value}")
+        if len(input_data) > 2:
+            lines.append(f"    ... (他 {len(input_data) - 2} 個のキー)")
+    
+    else:
+        # ノードの実行結果
+        lines.append(f"\n[タスク情報 #{task_count}] ノード実行完了")
+        lines.append(f"  ノード名: {node_name}")
+        result = chunk.get("result", {})
+        error = chunk.get("error")
+        
+        if error:
+            lines.append(f"  エラー: {error}")
+        else:
+            if isinstance(result, dict):
+                lines.append(f"  結果のキー: {list(result.keys())}")
+                # 結果の一部を表示
+                for key, value in islice(result.items(), 2):
+                    if isinstance(value, str) and len(value) > 60:
+                        lines.append(f"    {key}: {value[:60]}...")
+                    else:
+                        lines.append(f"    {key}: {value}")
+                if len(result) > 2:
+                    lines.append(f"    ... (他 {len(result) - 2} 個のキー)")
+            else:
+                lines.append(f"  結果: {result}")
+    
+    lines.append(f"  → 実行フローの詳細なトレース情報")
+    return lines
 
 
-if __name__ == "__main__":
+# モードごとに保持するイベント数の上限（長いグラフでも表示用バッファが増え続けないようにする）
+MAX_EVENTS = 256
+
+
+def print_events(events: deque, event_count: int) -> None:
+    """保持しているイベントを表示（上限を超えて捨てたイベントがあれば件数を表示）"""
+    dropped = event_count - len(events)
+    if dropped > 0:
+        print(f"\n（古いイベント {dropped} 件は省略）")
+    for lines in events:
+        for line in lines:
+            print(line)
+
+
+async def main():
+    """1回の実行でupdatesとtasksの両方を受け取り、モードごとに表示"""
     initial_state = {"topic": "アイスクリーム", "joke": "", "step_count": 0}
     
+    # stream_modeをリストで渡すと、1回の実行で (モード名, チャンク) のタプルが返される
+    # （モードごとに実行し直すと、LLMノードが2回ずつ呼ばれてしまう）
+    update_events = deque(maxlen=MAX_EVENTS)
+    task_events = deque(maxlen=MAX_EVENTS)
+    update_count = 0
+    task_count = 0
+    async for mode, chunk in graph.astream(initial_state, stream_mode=["updates", "tasks"]):
+        if mode == "updates":
+            update_count += 1
+            update_events.append(format_update_chunk(update_count, chunk))
+        elif mode == "tasks":
+            task_count += 1
+            task_events.append(format_task_event(task_count, chunk))
+    
     print("\n" + "=" * 80)
     print("【比較1】stream_mode='updates' の動作")
     print("=" * 80)
@@ -106,90 +200,17 @@ if __name__ == "__main__":
     print("メモリ効率: 良い（差分のみ）")
     print("\n" + "-" * 80)
     
-    update_count = 0
-    for chunk in graph.stream(initial_state, stream_mode="updates"):
-        update_count += 1
-        node_name = list(chunk.keys())[0]
-        update = chunk[node_name]
-        print(f"\n[更新 #{update_count}] ノード: {node_name}")
-        for key, value in update.items():
-            if isinstance(value, str) and len(value) > 80:
-                display_value = value[:80] + "..."
-                print(f"  {key}: {display_value}")
-            else:
-                print(f"  {key}: {value}")
-        print(f"  → このノードで変更されたフィールドのみが表示される")
+    print_events(update_events, update_count)
     
     print("\n" + "=" * 80)
-    print("【比較2】stream_mode='debug' の動作")
+    print("【比較2】stream_mode='tasks' の動作（debugモードのノード実行イベント）")
     print("=" * 80)
-    print("\n特徴: 可能な限り多くの情報（ノード名、完全な状態、実行フローなど）")
-    print("形式: 詳細なデバッグ情報（構造は複雑）")
-    print("メモリ効率: やや悪い（詳細情報が多い）")
+    print("\n特徴: ノードの実行開始・完了（ノード名、入力、結果、トリガーなど）")
+    print("形式: タスク情報そのもの（debugモードのstep/timestamp/typeのラッパーなし）")
+    print("メモリ効率: debugよりは良い（ラッパー分が減る）")
     print("\n" + "-" * 80)
     
-    debug_count = 0
-    for chunk in graph.stream(initial_state, stream_mode="debug"):
-        debug_count += 1
-        
-        # debugモードの構造: {step, timestamp, type, payload}
-        if isinstance(chunk, dict):
-            event_type = chunk.get("type", "unknown")
-            step = chunk.get("step", "?")
-            timestamp = chunk.get("timestamp", "")
-            payload = chunk.get("payload", {})
-            node_name = payload.get("name", "unknown")
-            
-            if event_type == "task":
-                # ノードの実行開始
-                print(f"\n[デバッグ情報 #{debug_count}] ノード実行開始")
-                print(f"  ステップ: {step}")
-                print(f"  ノード名: {node_name}")
-                print(f"  タイムスタンプ: {timestamp}")
-                input_data = payload.get("input", {})
-                print(f"  入力データのキー: {list(input_data.keys())}")
-                # 入力データの一部を表示
-                for key, value in list(input_data.items())[:2]:
-                    if isinstance(value, str) and len(value) > 60:
-                        print(f"    {key}: {value[:60]}...")
-                    else:
-                        print(f"    {key}: {value}")
-                if len(input_data) > 2:
-                    print(f"    ... (他 {len(input_data) - 2} 個のキー)")
-            
-            elif event_type == "task_result":
-                # ノードの実行結果
-                print(f"\n[デバッグ情報 #{debug_count}] ノード実行完了")
-                print(f"  ステップ: {step}")
-                print(f"  ノード名: {node_name}")
-                print(f"  タイムスタンプ: {timestamp}")
-                result = payload.get("result", {})
-                error = payload.get("error")
-                
-                if error:
-                    print(f"  エラー: {error}")
-                else:
-                    if isinstance(result, dict):
-                        print(f"  結果のキー: {list(result.keys())}")
-                        # 結果の一部を表示
-                        for key, value in list(result.items())[:2]:
-                            if isinstance(value, str) and len(value) > 60:
-                                print(f"    {key}: {value[:60]}...")
-                            else:
-                                print(f"    {key}: {value}")
-                        if len(result) > 2:
-                            print(f"    ... (他 {len(result) - 2} 個のキー)")
-                    else:
-                        print(f"  結果: {result}")
-            
-            else:
-                # その他のイベントタイプ
-                print(f"\n[デバッグ情報 #{debug_count}] イベントタイプ: {event_type}")
-                print(f"  ステップ: {step}")
-                print(f"  タイムスタンプ: {timestamp}")
-                print(f"  ペイロードのキー: {list(payload.keys())}")
-        
-        print(f"  → 実行フローの詳細なトレース情報")
+    print_events(task_events, task_count)
     
     print("\n" + "=" * 80)
     print("【主な違いのまとめ】")
@@ -208,6 +229,7 @@ if __name__ == "__main__":
    - イベントタイプ: 
      * "task": ノードの実行開始（入力データを含む）
      * "task_result": ノードの実行完了（結果データを含む）
+     * "checkpoint": チェックポイントの保存
    - 含まれる情報:
      * ステップ番号
      * タイムスタンプ（各イベントの実行時刻）
@@ -222,9 +244,18 @@ if __name__ == "__main__":
      * task: {'step': 1, 'type': 'task', 'payload': {'name': 'refine_topic', 'input': {...}}}
      * task_result: {'step': 1, 'type': 'task_result', 'payload': {'name': 'refine_topic', 'result': {...}}}
 
+3. tasks / checkpoints モード（debugモードを分割したもの）:
+   - tasks: debugのtask/task_resultイベントのpayloadだけが返される
+   - checkpoints: debugのcheckpointイベントのpayloadだけが返される
+   - step/timestamp/typeのラッパーがないので、必要なイベントだけを軽く受け取れる
+   - 出力例（tasks）:
+     * 実行開始: {'id': '...', 'name': 'refine_topic', 'input': {...}, 'triggers': (...)}
+     * 実行完了: {'id': '...', 'name': 'refine_topic', 'error': None, 'result': {...}, 'interrupts': []}
+
 【重要な注意点】
 - debugモードは、updatesやvaluesと重複する情報を含む可能性がある
 - debugモードとupdates/valuesを同時に指定するのは非推奨（重複する）
+- ノードの実行開始・完了だけが必要なら、debugの代わりにtasksを使う
 - LLMトークンも取得したい場合は、stream_mode=["debug", "messages"]を使用
 
 【いつ updates を使うべきか？】
@@ -243,3 +274,6 @@ if __name__ == "__main__":
     """)
     print("=" * 80)
 
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
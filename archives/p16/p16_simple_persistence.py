@@ -6,11 +6,19 @@ P16: 基本的な永続化の例
 """
 
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
 from langchain_core.runnables import RunnableConfig
 from typing import Annotated
 from typing_extensions import TypedDict
 from operator import add
+from dotenv import load_dotenv
+import os
+import sqlite3
+
+load_dotenv()
+
+# チェックポイントの保存先（デフォルトはメモリ上。ファイルを指定するとプロセス終了後も残る）
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", ":memory:")
 
 
 # 状態の定義
@@ -33,6 +41,27 @@ def node_b(state: State) -> dict:
     return {"foo": "b", "bar": ["b"]}
 
 
+# まとめで表示する、今回の実行の最初のチェックポイントから数えたstepごとの見出し
+# （ファイルに保存して同じスレッドで再実行すると、stepは前回の続きから数えられるため）
+STEP_LABELS = {
+    0: "1. 初期状態（START）:",
+    1: "2. node_a実行後:",
+    2: "3. node_b実行後:",
+    3: "4. 最終状態（END）:",
+}
+
+
+def create_checkpointer(path: str) -> SqliteSaver:
+    """SQLiteのチェックポインタを作成"""
+    # グラフはスレッドプールからも実行されるため、別スレッドからの接続利用を許可する
+    conn = sqlite3.connect(path, check_same_thread=False)
+    if path != ":memory:":
+        # WALモードにして、書き込み中でも履歴を読めるようにする
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return SqliteSaver(conn)
+
+
 def main():
     """メイン関数"""
     print("=" * 60)
@@ -55,8 +84,8 @@ def main():
     # チェックポインタの作成
     print("2. チェックポインタの作成")
     print("-" * 60)
-    checkpointer = MemorySaver()
-    print("✓ MemorySaver を作成しました")
+    checkpointer = create_checkpointer(CHECKPOINT_DB)
+    print(f"✓ SqliteSaver を作成しました（保存先: {CHECKPOINT_DB}）")
     print()
 
     # グラフのコンパイル（チェックポインタを設定）
@@ -77,7 +106,24 @@ def main():
     print("5. グラフの実行")
     print("-" * 60)
     print("初期状態でグラフを実行します...")
-    result = graph.invoke({}, config)
+    # checkpointsモードで、保存されたチェックポイントを実行中にそのまま受け取る
+    # （実行後にget_state_historyでチェックポイントを読み直さなくて済む）
+    # valuesモードには割り込み（interrupt）の情報も含まれるので、
+    # 最終状態はget_stateを呼ばずにここから取得する
+    checkpoints = []
+    result = {}
+    for mode, chunk in graph.stream({}, config, stream_mode=["values", "updates", "checkpoints"]):
+        if mode == "checkpoints":
+            checkpoints.append(chunk)
+        elif mode == "values":
+            result = chunk
+        elif mode == "updates":
+            node_name = next(iter(chunk))
+            # 割り込みはvaluesモード側で表示する
+            if node_name != "__interrupt__":
+                print(f"    {node_name} の更新: {chunk[node_name]}")
+    if "__interrupt__" in result:
+        print(f"  割り込み: {result['__interrupt__']}")
     print(f"✓ 実行完了")
     print(f"  最終状態: {result}")
     print()
@@ -93,35 +139,33 @@ def main():
     print()
 
     # 状態履歴の取得
-    print("7. 状態履歴の取得")
+    print("7. 実行中に保存されたチェックポイント")
     print("-" * 60)
-    history = graph.get_state_history(config)
-    print(f"✓ チェックポイント数: {len(list(history))}")
+    print(f"✓ チェックポイント数: {len(checkpoints)}")
     print()
     
-    # 各チェックポイントの詳細を表示
-    print("8. 各チェックポイントの詳細")
-    print("-" * 60)
-    history_list = list(graph.get_state_history(config))
-    # stepの値でソート（-1, 0, 1, 2の順）
+    # stepの値でソート（初回の実行では -1, 0, 1, 2 の順）
     history_sorted = sorted(
-        history_list, 
-        key=lambda x: x.metadata.get('step', 999) if x.metadata else 999
+        checkpoints, 
+        key=lambda x: (x["metadata"] or {}).get('step', 999)
     )
+    # 今回の実行の最初のstepを0として数え直す
+    first_step = (history_sorted[0]["metadata"] or {}).get('step', 999)
+    step_to_cp = {(cp["metadata"] or {}).get('step', 999) - first_step: cp for cp in history_sorted}
     
+    # 各チェックポイントの詳細を表示
+    print("8. 各チェックポイントの詳細")
+    print("-" * 60)
     for i, checkpoint in enumerate(history_sorted, 1):
         print(f"\nチェックポイント {i}:")
         # チェックポイントIDはconfigから取得
-        checkpoint_id = checkpoint.config.get('configurable', {}).get('checkpoint_id', 'N/A')
+        checkpoint_id = checkpoint["config"].get('configurable', {}).get('checkpoint_id', 'N/A')
         print(f"  チェックポイントID: {checkpoint_id}")
-        # created_at属性を使用
-        if hasattr(checkpoint, 'created_at'):
-            print(f"  作成日時: {checkpoint.created_at}")
-        print(f"  状態の値: {checkpoint.values}")
-        print(f"  次に実行するノード: {checkpoint.next}")
-        if checkpoint.metadata:
-            step = checkpoint.metadata.get('step', 'N/A')
-            source = checkpoint.metadata.get('source', 'N/A')
+        print(f"  状態の値: {checkpoint['values']}")
+        print(f"  次に実行するノード: {tuple(checkpoint['next'])}")
+        if checkpoint["metadata"]:
+            step = checkpoint["metadata"].get('step', 'N/A')
+            source = checkpoint["metadata"].get('source', 'N/A')
             print(f"  メタデータ: step={step}, source={source}")
     
     print()
@@ -133,28 +177,14 @@ def main():
     print()
     
     # stepの値に基づいて表示
-    for cp in history_sorted:
-        step = cp.metadata.get('step', 999) if cp.metadata else 999
-        if step == -1:
-            print("1. 初期状態（START）:")
-            print(f"   状態: {cp.values}")
-            print(f"   次に実行するノード: {cp.next}")
-            print()
-        elif step == 0:
-            print("2. node_a実行後:")
-            print(f"   状態: {cp.values}")
-            print(f"   次に実行するノード: {cp.next}")
-            print()
-        elif step == 1:
-            print("3. node_b実行後:")
-            print(f"   状態: {cp.values}")
-            print(f"   次に実行するノード: {cp.next}")
-            print()
-        elif step == 2:
-            print("4. 最終状態（END）:")
-            print(f"   状態: {cp.values}")
-            print(f"   次に実行するノード: {cp.next}")
-            print()
+    for step, label in STEP_LABELS.items():
+        cp = step_to_cp.get(step)
+        if cp is None:
+            continue
+        print(label)
+        print(f"   状態: {cp['values']}")
+        print(f"   次に実行するノード: {tuple(cp['next'])}")
+        print()
     print()
     print("各チェックポイントは、グラフの特定の時点での状態をキャプチャし、")
     print("後での分析や再実行に役立ちます。")
@@ -166,6 +196,8 @@ def main():
     print("- チェックポイントから状態を復元して、実行を再開できます")
     print()
 
+    checkpointer.conn.close()
+
 
 if __name__ == "__main__":
     main()